@@ -9,6 +9,8 @@ from sedona.utils import KryoSerializer, SedonaKryoRegistrator
 class SparkSedonaFactory:
     @staticmethod
     def session():
+        # pin python threads to jvm threads so per-thread scheduler pools stick
+        os.environ.setdefault("PYSPARK_PIN_THREAD", "true")
         extra_jars_dir = Path(os.environ["SPARK_HOME"]) / "extra_jars"
         extra_jars = [jar.as_posix() for jar in extra_jars_dir.glob("*.jar")]
         spark = (
@@ -23,6 +25,7 @@ class SparkSedonaFactory:
             )
             .config("spark.jars", ",".join(extra_jars))
             .config("sedona.global.charset", "utf8")
+            .config("spark.scheduler.mode", "FAIR")
             .getOrCreate()
         )
         SedonaRegistrator.registerAll(spark)
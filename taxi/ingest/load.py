@@ -24,13 +24,20 @@ class TripLoader:
         self.timescale_db = TimeScaleClient(database="hosted")
         self.stage = Path(__file__).parent.parent / "data" / "stage"
 
-    def load(self, files):
-        with ProcessPoolExecutor(max_workers=cpu_count()) as executor:
-            futures = [executor.submit(self.copy, file) for file in files]
-            for future in as_completed(futures):
-                result = future.result()
-                if result:
-                    print(" ".join(result))
+    def load(self, files, executor=None):
+        """
+        Copy files on the given process pool, or on a pool of our own. Callers
+        loading from several threads should share one pool.
+        """
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=cpu_count()) as executor:
+                return self.load(files, executor)
+
+        futures = [executor.submit(self.copy, file) for file in files]
+        for future in as_completed(futures):
+            result = future.result()
+            if result:
+                print(" ".join(result))
 
     @backoff.on_exception(
         backoff.constant,
@@ -47,12 +54,18 @@ class TripLoader:
             raise error
 
     def psql_copy_load(self, file: str):
-        values, count = self.read_partition(file)
+        values, count, days = self.read_partition(file)
         # print(values[0])
 
         conn = self.timescale_db.connection
         copy_mgr = CopyManager(conn, "trip", cols)
         copy_mgr.copy(values)
+        # queue the loaded days for long_trip in the same transaction as the copy
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO long_trip_refresh (day) VALUES (%s);",
+            [(day,) for day in days],
+        )
         conn.commit()
 
         Path(file).unlink()
@@ -78,4 +91,5 @@ class TripLoader:
         )
         df["passenger_count"] = df["passenger_count"].astype(int)
         # print(df.dtypes)
-        return [tuple(row) for row in df.values], str(df.shape[0])
+        days = pd.to_datetime(df["pickup_datetime"]).dt.date.unique()
+        return [tuple(row) for row in df.values], str(df.shape[0]), sorted(days)
@@ -0,0 +1,115 @@
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+
+@dataclass(frozen=True)
+class WorkUnit:
+    file: Path
+    start: int
+    stop: int
+    num_rows: int
+    size: int
+    whole: bool = False
+
+    @property
+    def name(self):
+        return "rg{start:04d}-{end:04d}".format(start=self.start, end=self.stop - 1)
+
+    @property
+    def path(self):
+        """
+        Split parquet file holding row groups [start, stop) of the raw file.
+        Keeps the raw subdir and the "_YYYY-MM" stem segment so that transformers
+        can route and parse it the same way as a raw monthly file.
+        """
+        return (
+            self.file.parent.parent.parent
+            / "split"
+            / self.file.parts[-2]
+            / ("{stem}_{name}.parquet".format(stem=self.file.stem, name=self.name))
+        )
+
+
+class TripPlanner:
+    def __init__(self, target_size=128 * 1024 * 1024, workers=4):
+        self.target_size = target_size
+        self.workers = workers
+        self.stage = Path(__file__).parent.parent / "data" / "stage"
+
+    def plan(self, files):
+        units = []
+        for file in files:
+            if self.legacy_stage(Path(file)):
+                continue
+            units.extend(self.plan_file(Path(file)))
+        # schedule the largest units first so small ones fill in at the tail
+        return sorted(units, key=lambda unit: unit.size, reverse=True)
+
+    def legacy_stage(self, file: Path):
+        """
+        Months fully staged by the per-file pipeline (stage/<stem>/_SUCCESS) are
+        not split again; any csv partitions left there are loaded as they are.
+        """
+        file_stage = self.stage / file.stem
+        if (file_stage / "_SUCCESS").exists():
+            return file_stage
+
+    def plan_file(self, file: Path):
+        """
+        Coalesce consecutive row groups from the parquet footer into work units
+        of roughly target_size (uncompressed) bytes.
+        """
+        metadata = pq.ParquetFile(file).metadata
+        units, start, num_rows, size = [], 0, 0, 0
+        for index in range(metadata.num_row_groups):
+            row_group = metadata.row_group(index)
+            num_rows += row_group.num_rows
+            size += row_group.total_byte_size
+            if size >= self.target_size:
+                units.append(WorkUnit(file, start, index + 1, num_rows, size))
+                start, num_rows, size = index + 1, 0, 0
+        if start < metadata.num_row_groups:
+            units.append(WorkUnit(file, start, metadata.num_row_groups, num_rows, size))
+        if len(units) == 1:
+            units = [replace(units[0], whole=True)]
+        return units
+
+    def split(self, unit: WorkUnit):
+        """
+        Write the unit's row groups out and return the file to transform. A unit
+        covering the whole file is transformed straight from the raw file.
+        """
+        if unit.whole:
+            return unit.file
+        if unit.path.exists():
+            return unit.path
+        unit.path.parent.mkdir(parents=True, exist_ok=True)
+        table = pq.ParquetFile(unit.file).read_row_groups(range(unit.start, unit.stop))
+        partial = unit.path.with_suffix(".tmp")
+        pq.write_table(table, partial)
+        partial.rename(unit.path)
+        return unit.path
+
+    def unit_stage(self, unit: WorkUnit):
+        return self.stage / unit.file.stem / unit.name
+
+    def status(self, unit: WorkUnit):
+        """
+        pending: not yet staged (or Spark write did not finish)
+        staged: csv partitions waiting to be loaded
+        loaded: every csv partition was copied to Timescale and removed
+        """
+        unit_stage = self.unit_stage(unit)
+        if not (unit_stage / "_SUCCESS").exists():
+            return "pending"
+        if any(unit_stage.glob("*.csv")):
+            return "staged"
+        return "loaded"
+
+    def report(self, units):
+        counts = {"pending": 0, "staged": 0, "loaded": 0}
+        for unit in units:
+            counts[self.status(unit)] += 1
+        return counts
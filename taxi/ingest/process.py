@@ -26,9 +26,16 @@ class TripProcessor:
         transformer = {
             "Pre2011": Pre2011Transformer,
             "Post2011": Post2011Transformer,
-        }.get(subdir)
-        df = self.validate(transformer(self.spark).transform(file))
-        self.write(df, file_stage)
+        }.get(subdir)(self.spark)
+        # each file gets its own fair scheduler pool so concurrent units share
+        # executors instead of queueing FIFO in the default pool
+        self.spark.sparkContext.setLocalProperty("spark.scheduler.pool", file.stem)
+        try:
+            df = self.validate(transformer.transform(file))
+            self.write(df, file_stage)
+        finally:
+            for view in transformer.views:
+                self.spark.catalog.dropTempView(view)
 
     def validate(self, df):
         valid_schema = {
@@ -109,13 +116,17 @@ class TripProcessor:
 class Post2011Transformer:
     def __init__(self, spark):
         self.spark = spark
+        self.views = []
 
     def transform(self, file: Path):
+        # views are suffixed per file so units can be transformed concurrently
+        suffix = file.stem.replace("-", "_")
         raw_post2011_trips = self.spark.read.parquet(file.as_posix())
         # raw_post2011_trips = raw_post2011_trips.limit(100)  # testing
-        raw_post2011_trips.createOrReplaceTempView("raw_post2011_trips")
+        raw_post2011_trips.createOrReplaceTempView(f"raw_post2011_trips_{suffix}")
+        self.views.append(f"raw_post2011_trips_{suffix}")
         post2011_trips = self.spark.sql(
-            """
+            f"""
             SELECT t.Trip_distance AS trip_distance,
                 t.fare_amount,
                 CAST(t.passenger_count AS integer) AS passenger_count,
@@ -123,7 +134,7 @@ class Post2011Transformer:
                 CAST(t.DOLocationID AS integer) AS DOLocationID,
                 date_format(t.tpep_pickup_datetime,'yyyy-MM-dd HH:mm:ss') AS pickup_datetime,
                 date_format(t.tpep_dropoff_datetime,'yyyy-MM-dd HH:mm:ss') AS dropoff_datetime
-            FROM raw_post2011_trips t 
+            FROM raw_post2011_trips_{suffix} t 
             WHERE t.PULocationID <= 263 
                 AND t.DOLocationID <= 263
                 AND t.tpep_pickup_datetime >= '2009-01-01'
@@ -140,41 +151,48 @@ class Post2011Transformer:
 class Pre2011Transformer:
     def __init__(self, spark):
         self.spark = spark
+        self.views = []
 
     def transform(self, file: Path):
-        year = datetime.strptime(file.stem.split("_")[-1], "%Y-%m").year
-        self.read_pre2011_trips(file.as_posix(), year)
-        return self.trip_zone_spatial_join(year)
+        year = datetime.strptime(file.stem.split("_")[2], "%Y-%m").year
+        # views are suffixed per file so units can be transformed concurrently
+        suffix = file.stem.replace("-", "_")
+        self.read_pre2011_trips(file.as_posix(), year, suffix)
+        return self.trip_zone_spatial_join(year, suffix)
 
-    def read_pre2011_trips(self, file_path, year):
+    def read_pre2011_trips(self, file_path, year, suffix):
         pre2011_trips = self.spark.read.parquet(file_path)
         # pre2011_trips = pre2011_trips.limit(100)  # testing
-        pre2011_trips.createOrReplaceTempView("pre2011_trips")
+        pre2011_trips.createOrReplaceTempView(f"pre2011_trips_{suffix}")
+        self.views.append(f"pre2011_trips_{suffix}")
 
         if year == 2009:
-            query = """
+            query = f"""
             SELECT *,
                 ST_Point(Start_Lon, Start_Lat) AS PU_geometry,
                 ST_Point(End_Lon, End_Lat) AS DO_geometry
-            FROM pre2011_trips
+            FROM pre2011_trips_{suffix}
             """
 
         if year == 2010:
-            query = """
+            query = f"""
             SELECT *,
                 ST_Point(pickup_longitude, pickup_latitude) AS PU_geometry,
                 ST_Point(dropoff_longitude, dropoff_latitude) AS DO_geometry
-            FROM pre2011_trips
+            FROM pre2011_trips_{suffix}
             """
 
         pre2011_trips_with_geom = self.spark.sql(query)
-        pre2011_trips_with_geom.createOrReplaceTempView("pre2011_trips_with_geom")
+        pre2011_trips_with_geom.createOrReplaceTempView(
+            f"pre2011_trips_with_geom_{suffix}"
+        )
+        self.views.append(f"pre2011_trips_with_geom_{suffix}")
         # pre2011_trips_with_geom.printSchema()
         # print(pre2011_trips_with_geom.limit(5).toPandas())
 
-    def trip_zone_spatial_join(self, year):
+    def trip_zone_spatial_join(self, year, suffix):
         if year == 2009:
-            query = """
+            query = f"""
             SELECT t.Trip_distance AS trip_distance,
                 t.Fare_Amt AS fare_amount,
                 CAST(t.Passenger_Count AS integer) AS passenger_count,
@@ -182,7 +200,7 @@ class Pre2011Transformer:
                 CAST(DO_zone.LocationID AS integer) AS DOLocationID,
                 date_format(t.Trip_Pickup_DateTime,'yyyy-MM-dd HH:mm:ss') AS pickup_datetime,
                 date_format(t.Trip_Dropoff_DateTime,'yyyy-MM-dd HH:mm:ss') AS dropoff_datetime
-            FROM pre2011_trips_with_geom t
+            FROM pre2011_trips_with_geom_{suffix} t
             INNER JOIN taxi_zones AS PU_zone ON ST_Intersects(PU_zone.geometry, t.PU_geometry)
             INNER JOIN taxi_zones AS DO_zone ON ST_Intersects(DO_zone.geometry, t.DO_geometry)
             WHERE t.Trip_Pickup_DateTime >= '2009-01-01'
@@ -191,7 +209,7 @@ class Pre2011Transformer:
             """
 
         if year == 2010:
-            query = """
+            query = f"""
             SELECT t.trip_distance,
                 t.fare_amount,
                 CAST(t.passenger_count AS integer) AS passenger_count,
@@ -199,7 +217,7 @@ class Pre2011Transformer:
                 CAST(DO_zone.LocationID AS integer) AS DOLocationID,
                 date_format(t.pickup_datetime,'yyyy-MM-dd HH:mm:ss') AS pickup_datetime,
                 date_format(t.dropoff_datetime,'yyyy-MM-dd HH:mm:ss') AS dropoff_datetime
-            FROM pre2011_trips_with_geom t
+            FROM pre2011_trips_with_geom_{suffix} t
             INNER JOIN taxi_zones AS PU_zone ON ST_Intersects(PU_zone.geometry, t.PU_geometry)
             INNER JOIN taxi_zones AS DO_zone ON ST_Intersects(DO_zone.geometry, t.DO_geometry)
             WHERE t.pickup_datetime >= '2009-01-01'
@@ -1,9 +1,11 @@
-import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import cpu_count, get_context
 from pathlib import Path
 
 from common.spark import SparkSedonaFactory
 from ingest.extract import TripExtractor
 from ingest.load import TripLoader
+from ingest.plan import TripPlanner
 from ingest.process import TripProcessor
 from timescale.client import TimeScaleClient
 from timescale.ddl import TripDatabase
@@ -15,23 +17,72 @@ if __name__ == "__main__":
     # Initialize database schema
     # TripDatabase().setup()
 
-    # Ingest normalized data to TimescaleDB
     raw = Path(__file__).parent / "data" / "raw"
-    stage = Path(__file__).parent / "data" / "stage"
-    spark = SparkSedonaFactory.session()
-    processor = TripProcessor(spark)
+    files = list(raw.glob("**/*.parquet"))
+    planner = TripPlanner()
     loader = TripLoader()
+    database = TripDatabase()
+
+    # Create long trip tables (idempotent) and replay refreshes left over from
+    # an interrupted run, or build long_trip for trips loaded before it existed
+    database.create_long_trip_tables()
+    database.refresh_long_trips()
 
-    for file in raw.glob("**/*.parquet"):
-        print(file.as_posix())
-        file_stage = stage / file.stem
+    # One bounded load pool shared by every unit. Workers are spawned rather than
+    # forked so they never inherit the py4j/JVM gateway threads.
+    load_pool = ProcessPoolExecutor(
+        max_workers=cpu_count(), mp_context=get_context("spawn")
+    )
 
-        if not file_stage.exists():
-            processor.transform(file, file_stage)
-            time.sleep(5)
+    # Finish loading months staged by the per-file pipeline
+    for file in files:
+        file_stage = planner.legacy_stage(file)
+        if not file_stage:
+            continue
 
-        files = [file.as_posix() for file in file_stage.glob("*.csv")]
+        legacy = [csv.as_posix() for csv in file_stage.glob("*.csv")]
 
-        if len(files) > 0:
+        if len(legacy) > 0:
             print(file_stage.as_posix())
-            loader.load(files)
+            loader.load(legacy, load_pool)
+            database.refresh_long_trips()
+
+    # Plan row group work units
+    units = planner.plan(files)
+
+    # Ingest normalized data to TimescaleDB
+    spark = SparkSedonaFactory.session()
+    processor = TripProcessor(spark)
+
+    def ingest(unit):
+        unit_stage = planner.unit_stage(unit)
+
+        if planner.status(unit) == "pending":
+            source = planner.split(unit)
+            processor.transform(source, unit_stage)
+            if source != unit.file:
+                source.unlink(missing_ok=True)
+
+        staged = [csv.as_posix() for csv in unit_stage.glob("*.csv")]
+
+        if len(staged) > 0:
+            print(unit_stage.as_posix())
+            loader.load(staged, load_pool)
+
+    # Units run concurrently, each in its own fair scheduler pool on the shared
+    # session, so one unit loads while others transform, and at most `workers`
+    # units are split at once
+    with load_pool, ThreadPoolExecutor(max_workers=planner.workers) as executor:
+        futures = {executor.submit(ingest, unit): unit for unit in units}
+        for future in as_completed(futures):
+            unit = futures[future]
+            try:
+                future.result()
+            except Exception as error:
+                print(f"{unit.file.as_posix()} {unit.name} failed: {error!r}")
+                continue
+
+            # Maintain long trips for the days queued by the loader
+            database.refresh_long_trips()
+
+    print(planner.report(units))
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from pathlib import Path
 
 import pandas as pd
@@ -11,8 +12,10 @@ pd.set_option("display.max_columns", None)
 
 
 class TripDatabase:
-    def __init__(self):
+    def __init__(self, percentiles=(0.9,), tolerance=0.05):
         self.timescale_db = TimeScaleClient(database="hosted")
+        self.percentiles = percentiles
+        self.tolerance = tolerance
 
     def setup(self):
         with self.timescale_db.connection as conn:
@@ -27,6 +30,7 @@ class TripDatabase:
         self.enable_trip_hypertable_compression()
         self.create_pickup_location_daily_summary_view()
         self.create_trip_distance_daily_view()
+        self.create_long_trip_tables()
 
     def create_location_table(self):
         return """
@@ -134,6 +138,262 @@ class TripDatabase:
         conn.commit()
         conn.close()
 
+    def create_long_trip_tables(self):
+        with self.timescale_db.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS long_trip_threshold (
+                    version SERIAL PRIMARY KEY,
+                    percentile DOUBLE PRECISION     NOT NULL,
+                    threshold DOUBLE PRECISION      NOT NULL,
+                    created_at TIMESTAMP            NOT NULL DEFAULT now()
+                );
+                """
+            )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS long_trip (
+                    trip_distance DOUBLE PRECISION  NULL,
+                    fare_amount DOUBLE PRECISION    NULL,
+                    passenger_count INTEGER         NULL,
+                    PULocationID INTEGER            NULL,
+                    DOLocationID INTEGER            NULL,
+                    pickup_datetime TIMESTAMP       NOT NULL,
+                    dropoff_datetime TIMESTAMP      NOT NULL,
+                    percentile DOUBLE PRECISION     NOT NULL,
+                    threshold_version INTEGER       NOT NULL,
+                    FOREIGN KEY (threshold_version) REFERENCES long_trip_threshold (version)
+                );
+                """
+            )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS long_trip_refresh (
+                    id SERIAL PRIMARY KEY,
+                    day DATE                        NOT NULL
+                );
+                """
+            )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS long_trip_percentile_distance_idx
+                ON long_trip (percentile, trip_distance DESC);
+                """
+            )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS long_trip_percentile_pickup_idx
+                ON long_trip (percentile, pickup_datetime);
+                """
+            )
+            conn.commit()
+
+    def refresh_long_trips(self):
+        """
+        Maintain long_trip for the days the loader queued in long_trip_refresh.
+        Queued days are merged into contiguous ranges and each range is refreshed
+        on its own, then only the rows that were read are dequeued, so a failed
+        refresh is replayed on the next call.
+        The threshold for each percentile is only versioned again once it drifts
+        more than `tolerance` (relative) from the current version. A percentile
+        with no version yet is built from the whole trip table, queue or not.
+        """
+        ids, days = self.get_long_trip_refresh_days()
+        ranges = self.merge_day_ranges(days)
+        for start, end in ranges:
+            self.refresh_trip_distance_daily_view(start, end)
+
+        for percentile in self.percentiles:
+            current = self.get_long_trip_threshold(percentile)
+            # nothing queued, but a percentile without a version still needs its
+            # initial build (e.g. a database loaded before long_trip existed)
+            if current is not None and not ranges:
+                continue
+
+            threshold = self.get_trip_distance_percentile(percentile)
+            if threshold is None:
+                continue
+
+            if current is None:
+                version = self.add_long_trip_threshold(percentile, threshold)
+                self.rebuild_long_trips(percentile, version, threshold)
+                continue
+
+            version, previous = current
+            if abs(threshold - previous) > self.tolerance * previous:
+                version = self.add_long_trip_threshold(percentile, threshold)
+                self.rethreshold_long_trips(percentile, version, previous, threshold)
+                previous = threshold
+
+            for start, end in ranges:
+                self.insert_long_trips(percentile, version, previous, start, end)
+
+        if ids:
+            self.clear_long_trip_refresh_days(ids)
+
+    def get_long_trip_refresh_days(self):
+        with self.timescale_db.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, day FROM long_trip_refresh;")
+            rows = cursor.fetchall()
+            return [row[0] for row in rows], sorted({row[1] for row in rows})
+
+    def clear_long_trip_refresh_days(self, ids):
+        with self.timescale_db.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM long_trip_refresh WHERE id = ANY(%s);", (ids,))
+            conn.commit()
+
+    def merge_day_ranges(self, days):
+        """
+        Merge sorted days into contiguous [start, end) ranges so that a stray
+        pickup date doesn't stretch a refresh over years of chunks.
+        """
+        ranges = []
+        for day in days:
+            if ranges and ranges[-1][1] == day:
+                ranges[-1][1] = day + timedelta(days=1)
+            else:
+                ranges.append([day, day + timedelta(days=1)])
+        return [tuple(day_range) for day_range in ranges]
+
+    def refresh_trip_distance_daily_view(self, start, end):
+        conn = self.timescale_db.connection
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            CALL refresh_continuous_aggregate(
+                'trip_distance_daily', %s::timestamp, %s::timestamp
+            );
+            """,
+            (start, end),
+        )
+        conn.close()
+
+    def get_trip_distance_percentile(self, percentile):
+        with self.timescale_db.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT approx_percentile(%s, rollup(tdigest))
+                FROM trip_distance_daily;
+                """,
+                (percentile,),
+            )
+            return cursor.fetchone()[0]
+
+    def get_long_trip_threshold(self, percentile):
+        with self.timescale_db.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT version, threshold
+                FROM long_trip_threshold
+                WHERE percentile = %s
+                ORDER BY version DESC
+                LIMIT 1;
+                """,
+                (percentile,),
+            )
+            return cursor.fetchone()
+
+    def add_long_trip_threshold(self, percentile, threshold):
+        with self.timescale_db.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO long_trip_threshold (percentile, threshold)
+                VALUES (%s, %s)
+                RETURNING version;
+                """,
+                (percentile, threshold),
+            )
+            version = cursor.fetchone()[0]
+            conn.commit()
+            return version
+
+    def insert_long_trips(self, percentile, version, threshold, start, end):
+        with self.timescale_db.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                DELETE FROM long_trip
+                WHERE percentile = %s
+                    AND pickup_datetime >= %s
+                    AND pickup_datetime < %s;
+                """,
+                (percentile, start, end),
+            )
+            cursor.execute(
+                """
+                INSERT INTO long_trip
+                SELECT trip.*, %s, %s
+                FROM trip
+                WHERE pickup_datetime >= %s
+                    AND pickup_datetime < %s
+                    AND trip_distance > %s;
+                """,
+                (percentile, version, start, end, threshold),
+            )
+            conn.commit()
+
+    def rebuild_long_trips(self, percentile, version, threshold):
+        with self.timescale_db.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM long_trip WHERE percentile = %s;", (percentile,)
+            )
+            cursor.execute(
+                """
+                INSERT INTO long_trip
+                SELECT trip.*, %s, %s
+                FROM trip
+                WHERE trip_distance > %s;
+                """,
+                (percentile, version, threshold),
+            )
+            conn.commit()
+
+    def rethreshold_long_trips(self, percentile, version, previous, threshold):
+        """
+        A higher threshold only drops rows already in long_trip. A lower one adds
+        trips in (threshold, previous]; at these percentiles nearly every day has
+        trips in that band, so this scans the whole trip hypertable. The drift
+        tolerance is what keeps that rare.
+        """
+        with self.timescale_db.connection as conn:
+            cursor = conn.cursor()
+            if threshold > previous:
+                cursor.execute(
+                    """
+                    DELETE FROM long_trip
+                    WHERE percentile = %s AND trip_distance <= %s;
+                    """,
+                    (percentile, threshold),
+                )
+            else:
+                cursor.execute(
+                    """
+                    INSERT INTO long_trip
+                    SELECT trip.*, %s, %s
+                    FROM trip
+                    WHERE trip_distance > %s
+                        AND trip_distance <= %s;
+                    """,
+                    (percentile, version, threshold, previous),
+                )
+            cursor.execute(
+                """
+                UPDATE long_trip
+                SET threshold_version = %s
+                WHERE percentile = %s;
+                """,
+                (version, percentile),
+            )
+            conn.commit()
+
     def manually_compress_chunks(self):
         with self.timescale_db.connection as conn:
             cursor = conn.cursor()
@@ -191,11 +451,14 @@ class TripDatabase:
             cursor = conn.cursor()
             cursor.execute(
                 """
-                SELECT *
-                FROM trip
-                WHERE trip_distance > (SELECT approx_percentile(0.90, rollup(tdigest)) FROM trip_distance_daily)
+                SELECT trip_distance, fare_amount, passenger_count, pulocationid,
+                    dolocationid, pickup_datetime, dropoff_datetime
+                FROM long_trip
+                WHERE percentile = %s
+                ORDER BY trip_distance DESC
                 LIMIT 5;
-                """
+                """,
+                (self.percentiles[0],),
             )
             columns = [desc[0] for desc in cursor.description]
             df = pd.DataFrame(cursor.fetchall(), columns=columns)